@@ -1,12 +1,8 @@
 import streamlit as st
 import fitz  # PyMuPDF
 import re
-from fpdf import FPDF
-from io import BytesIO
-import barcode
-from barcode.writer import ImageWriter
-import tempfile
-import os
+import functools
+import pandas as pd
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -29,12 +25,34 @@ debug = st.toggle("Debug", value=False)
 
 # ---------------- Utilities ----------------
 
-# ---------------- Utilities ----------------
+# One "Label: value" line per alternative. Each sits in a zero-width
+# lookahead so a match never consumes lines another field still needs,
+# which keeps first-match-per-field identical to searching one at a time.
+_FIELD_PATTERNS = (
+    r"Carrier:\s*(?P<carrier>.+?)\s*$",
+    r"PRO\s*Number:\s*(?P<pro>[A-Za-z0-9-]+)\s*$",
+    r"Sales\s*Order:\s*(?P<so>SO-\d+[\w-]*)\s*$",
+    r"Primary\s*Reference:\s*(?P<primary_ref>SO-\d+[\w-]*)\s*$",
+    r"Job\s*Name:\s*(?P<job>.+?)\s*$",
+    r"QTY:\s*(?P<qty>.+?)\s*$",
+    r"Quantity:\s*(?P<quantity>.+?)\s*$",
+    r"Load\s*Number:\s*(?P<load>.+?)\s*$",
+    r"PLT\s*LOC\.?:\s*(?P<plt_loc>.+?)\s*$",
+    r"Location:\s*(?P<location>.+?)\s*$",
+    r"Pieces\s*[:\-]?\s*(?P<pieces>\d+)\s*$",
+)
+_FIELDS_RE = re.compile(r"(?im)^(?=\s*(?:" + "|".join(_FIELD_PATTERNS) + "))")
+_INLINE_PLT_LOC_RE = re.compile(r"(?i)\bPLT\s*LOC\b")
+_INLINE_PLT_LOC_SPLIT_RE = re.compile(r"(?i)\bPLT\s*LOC\.?:\s*")
+# Field regexes only need plain characters: no ligatures, no exact whitespace
+_TEXT_FLAGS = fitz.TEXTFLAGS_TEXT & ~(fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE)
+_NUM_RE = re.compile(r"\d+")
+_LEADING_NUM_RE = re.compile(r"^\s*(\d+)\b")
 
 def split_csv_like(value: str):
     if not value:
         return []
-    return [p.strip() for p in value.split(",") if p.strip()]
+    return [s for p in value.split(",") if (s := p.strip())]
 
 def normalize_carrier_scac(raw_carrier: str) -> str:
     """
@@ -66,15 +84,16 @@ def parse_qty_value(raw: str) -> int:
 
     raw = raw.strip()
 
-    if re.fullmatch(r"\d+", raw):
+    if _NUM_RE.fullmatch(raw):
         return int(raw)
 
-    m = re.match(r"^\s*(\d+)\b", raw)
+    m = _LEADING_NUM_RE.match(raw)
     if m:
         return int(m.group(1))
 
-    parts = split_csv_like(raw)
-    return len(parts) if parts else 1
+    # Only the count matters here, so don't build the list
+    count = sum(1 for p in raw.split(",") if p.strip())
+    return count or 1
 
 def extract_fields(text: str):
     """
@@ -105,43 +124,27 @@ def extract_fields(text: str):
       "QTY: 1 PLT LOC.: C1"
     """
 
-    # Carrier / PRO
-    carrier_match = re.search(r"(?im)^\s*Carrier:\s*(.+?)\s*$", text)
-    pro_match = re.search(r"(?im)^\s*PRO\s*Number:\s*([A-Za-z0-9-]+)\s*$", text)
-
-    # Sales Order OR Primary Reference
-    so_match = (
-        re.search(r"(?im)^\s*Sales\s*Order:\s*(SO-\d+[\w-]*)\s*$", text)
-        or re.search(r"(?im)^\s*Primary\s*Reference:\s*(SO-\d+[\w-]*)\s*$", text)
-    )
+    # Single pass over the page; keep the first value seen per field
+    found = {}
+    for m in _FIELDS_RE.finditer(text):
+        found.setdefault(m.lastgroup, m.group(m.lastgroup))
 
-    so = so_match.group(1).strip() if so_match else ""
-    scac = normalize_carrier_scac(carrier_match.group(1)) if carrier_match else ""
-    pro = pro_match.group(1).strip() if pro_match else ""
+    # Carrier / PRO; Sales Order OR Primary Reference
+    so = (found.get("so") or found.get("primary_ref") or "").strip()
+    scac = normalize_carrier_scac(found.get("carrier", ""))
+    pro = found.get("pro", "").strip()
 
     # Job Name OR QTY OR Quantity
-    job_match = re.search(r"(?im)^\s*Job\s*Name:\s*(.+?)\s*$", text)
-    qty_match = (
-        re.search(r"(?im)^\s*QTY:\s*(.+?)\s*$", text)
-        or re.search(r"(?im)^\s*Quantity:\s*(.+?)\s*$", text)
-    )
-
-    job_raw = job_match.group(1).strip() if job_match else ""
-    qty_raw_line = qty_match.group(1).strip() if qty_match else ""
+    job_raw = found.get("job", "").strip()
+    qty_raw_line = (found.get("qty") or found.get("quantity") or "").strip()
 
     # Load Number OR PLT LOC OR Location
-    load_match = re.search(r"(?im)^\s*Load\s*Number:\s*(.+?)\s*$", text)
-    plt_match = (
-        re.search(r"(?im)^\s*PLT\s*LOC\.?:\s*(.+?)\s*$", text)
-        or re.search(r"(?im)^\s*Location:\s*(.+?)\s*$", text)
-    )
-
-    load_raw = load_match.group(1).strip() if load_match else ""
-    plt_raw_line = plt_match.group(1).strip() if plt_match else ""
+    load_raw = found.get("load", "").strip()
+    plt_raw_line = (found.get("plt_loc") or found.get("location") or "").strip()
 
     # Combined new format: "QTY: 1 PLT LOC.: C1"
-    if qty_raw_line and re.search(r"(?i)\bPLT\s*LOC\b", qty_raw_line):
-        parts = re.split(r"(?i)\bPLT\s*LOC\.?:\s*", qty_raw_line, maxsplit=1)
+    if qty_raw_line and _INLINE_PLT_LOC_RE.search(qty_raw_line):
+        parts = _INLINE_PLT_LOC_SPLIT_RE.split(qty_raw_line, maxsplit=1)
         qty_part = parts[0].strip()
         loc_part = parts[1].strip() if len(parts) > 1 else ""
         qty_raw = qty_part
@@ -155,9 +158,8 @@ def extract_fields(text: str):
 
     # Fallback: Pieces: 3
     if not qty_raw:
-        pieces_match = re.search(r"(?im)^\s*Pieces\s*[:\-]?\s*(\d+)\s*$", text)
-        if pieces_match:
-            qty = int(pieces_match.group(1))
+        if "pieces" in found:
+            qty = int(found["pieces"])
 
     return {
         "scac": scac,
@@ -167,127 +169,344 @@ def extract_fields(text: str):
         "qty": qty,
     }
 
-def generate_barcode_image_path(value):
-    code128 = barcode.get("code128", value, writer=ImageWriter())
-    raw_path = os.path.join(tempfile.gettempdir(), value)
-    return code128.save(raw_path, options={"write_text": False})
+# ---------------- Code 128 ----------------
+
+# Bar (1) / space (0) modules per symbol value, most significant bit first.
+# Values 0-105 are 11 modules wide; STOP (106) carries the 2-module
+# termination bar and is 13 wide.
+CODE128_PATTERNS = (
+    0b11011001100, 0b11001101100, 0b11001100110, 0b10010011000, 0b10010001100,
+    0b10001001100, 0b10011001000, 0b10011000100, 0b10001100100, 0b11001001000,
+    0b11001000100, 0b11000100100, 0b10110011100, 0b10011011100, 0b10011001110,
+    0b10111001100, 0b10011101100, 0b10011100110, 0b11001110010, 0b11001011100,
+    0b11001001110, 0b11011100100, 0b11001110100, 0b11101101110, 0b11101001100,
+    0b11100101100, 0b11100100110, 0b11101100100, 0b11100110100, 0b11100110010,
+    0b11011011000, 0b11011000110, 0b11000110110, 0b10100011000, 0b10001011000,
+    0b10001000110, 0b10110001000, 0b10001101000, 0b10001100010, 0b11010001000,
+    0b11000101000, 0b11000100010, 0b10110111000, 0b10110001110, 0b10001101110,
+    0b10111011000, 0b10111000110, 0b10001110110, 0b11101110110, 0b11010001110,
+    0b11000101110, 0b11011101000, 0b11011100010, 0b11011101110, 0b11101011000,
+    0b11101000110, 0b11100010110, 0b11101101000, 0b11101100010, 0b11100011010,
+    0b11101111010, 0b11001000010, 0b11110001010, 0b10100110000, 0b10100001100,
+    0b10010110000, 0b10010000110, 0b10000101100, 0b10000100110, 0b10110010000,
+    0b10110000100, 0b10011010000, 0b10011000010, 0b10000110100, 0b10000110010,
+    0b11000010010, 0b11001010000, 0b11110111010, 0b11000010100, 0b10001111010,
+    0b10100111100, 0b10010111100, 0b10010011110, 0b10111100100, 0b10011110100,
+    0b10011110010, 0b11110100100, 0b11110010100, 0b11110010010, 0b11011011110,
+    0b11011110110, 0b11110110110, 0b10101111000, 0b10100011110, 0b10001011110,
+    0b10111101000, 0b10111100010, 0b11110101000, 0b11110100010, 0b10111011110,
+    0b10111101110, 0b11101011110, 0b11110101110, 0b11010000100, 0b11010010000,
+    0b11010011100, 0b1100011101011,
+)
+CODE128_START_B = 104
+CODE128_STOP = 106
+CODE128_QUIET_MODULES = 10
+
+def code128_values(value: str):
+    """
+    Encodes value in Code Set B: start, one symbol per character,
+    mod-103 checksum, stop.
+    """
+    values = [CODE128_START_B]
+    for ch in value:
+        code = ord(ch) - 32
+        if not 0 <= code <= 95:
+            raise ValueError(f"Character {ch!r} cannot be encoded in Code 128 set B")
+        values.append(code)
+
+    checksum = CODE128_START_B + sum(i * v for i, v in enumerate(values[1:], start=1))
+    values.append(checksum % 103)
+    values.append(CODE128_STOP)
+    return values
+
+def _symbol_bars(pattern):
+    """
+    (start, width) bar runs of one symbol pattern, plus its module width.
+    """
+    bars = []
+    width = pattern.bit_length()
+
+    for pos in range(width):
+        if pattern >> (width - 1 - pos) & 1:
+            if bars and bars[-1][0] + bars[-1][1] == pos:
+                bars[-1] = (bars[-1][0], bars[-1][1] + 1)
+            else:
+                bars.append((pos, 1))
+
+    return tuple(bars), width
+
+# Expanded once at import so encoding is a table lookup per symbol
+CODE128_BARS = tuple(_symbol_bars(p) for p in CODE128_PATTERNS)
+
+def code128_bars(value: str):
+    """
+    Returns (bars, modules): bars as (start, width) runs in modules,
+    modules as the full symbol width including both quiet zones.
+    """
+    bars = []
+    pos = CODE128_QUIET_MODULES
+
+    # Every symbol starts with a bar and ends with a space, so runs
+    # never continue across symbols and can be copied over as-is.
+    for v in code128_values(value):
+        symbol_bars, width = CODE128_BARS[v]
+        bars.extend((pos + start, run) for start, run in symbol_bars)
+        pos += width
+
+    return bars, pos + CODE128_QUIET_MODULES
+
+def code128_ops(value, x, y, w, h):
+    """
+    PDF path operators drawing value as bars filling the w x h box whose
+    bottom-left corner is (x, y) in PDF user space.
+    """
+    bars, modules = code128_bars(value)
+    module_w = w / modules
+
+    ops = [
+        f"{x + start * module_w:.3f} {y:.2f} {width * module_w:.3f} {h:.2f} re"
+        for start, width in bars
+    ]
+    ops.append("f")
+    return "\n".join(ops)
+
+# Written once per download: drop duplicate fonts/streams, compress everything
+PDF_SAVE_OPTIONS = dict(garbage=4, deflate=True, deflate_images=True, clean=True, use_objstms=1)
+
+LABEL_WIDTH = 792
+LABEL_HEIGHT = 612
+LABEL_FONT = "hebo"  # Helvetica-Bold metrics, for centring
+# Base-14, so never embedded; label content streams refer to it as /F1
+HELVETICA_BOLD_FONT = "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"
+
+def _pdf_text(text):
+    return text.encode("cp1252", errors="replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+def _text_op(x, y, text, fontsize):
+    """
+    Text showing operators for text at x with its baseline y from the top.
+    """
+    return b"BT /F1 %d Tf %.2f %.2f Td (" % (fontsize, x, LABEL_HEIGHT - y) + _pdf_text(text) + b") Tj ET"
+
+def _centered_text_op(y, text, fontsize):
+    x = (LABEL_WIDTH - fitz.get_text_length(text, fontname=LABEL_FONT, fontsize=fontsize)) / 2
+    return _text_op(x, y, text, fontsize)
+
+def _one_page_pdf(width, height, content, with_font=True):
+    """
+    Writes a one-page PDF by hand around a finished content stream. The
+    label layouts never change, so a fixed object list is all it takes.
+    /F1 is Helvetica-Bold when with_font is set.
+    """
+    resources = b"<< /Font << /F1 5 0 R >> >>" if with_font else b"<< >>"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+        b"/Resources %s /Contents 4 0 R >>" % (width, height, resources),
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+    ]
+    if with_font:
+        objects.append(HELVETICA_BOLD_FONT.encode("ascii"))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    return bytes(out)
+
+def _render_label_pdf(so, scac, pro):
+    """
+    The label template minus the barcode, as a one-page PDF.
+    """
+    ops = [
+        # Sales Order / Primary Reference
+        _centered_text_op(124, so, 80),
+        # Carrier / SCAC
+        _centered_text_op(449, scac, 130),
+    ]
+
+    # PRO text under the barcode
+    if pro:
+        ops.append(_centered_text_op(292.2, pro, 24))
+
+    return _one_page_pdf(LABEL_WIDTH, LABEL_HEIGHT, b"\n".join(ops))
+
+@functools.lru_cache(maxsize=256)
+def _base_label(so, scac, pro):
+    """
+    Everything on a label except the barcode, the pallet location and
+    "idx of total". Cached per (so, scac, pro) for one script run; Streamlit
+    re-executes this module on every rerun, so each run starts a fresh cache.
+    """
+    return fitz.open(stream=_render_label_pdf(so, scac, pro), filetype="pdf")
 
-def make_single_label_pdf(so, scac, pro, pallet_location, idx, total):
-    barcode_path = generate_barcode_image_path(pro) if pro else None
+BARCODE_RECT = fitz.Rect(196, 160, 596, 260)
 
-    pdf = FPDF(unit="pt", format=(792, 612))
-    pdf.add_page()
-    pdf.set_auto_page_break(False)
+@functools.lru_cache(maxsize=1024)
+def _barcode_page(pro):
+    """
+    The PRO barcode as its own one-page PDF, cached by PRO. show_pdf_page
+    turns it into one Form XObject per output document, so the bars are
+    written once per PRO however many labels and shipments share it.
+    Like _base_label, the cache only lasts one script run.
+    """
+    w, h = BARCODE_RECT.width, BARCODE_RECT.height
+    content = b"0 g " + code128_ops(pro, 0, 0, w, h).encode("ascii")
+    return fitz.open(stream=_one_page_pdf(w, h, content, with_font=False), filetype="pdf")
 
-    # Sales Order / Primary Reference
-    pdf.set_font("Arial", "B", 80)
-    pdf.set_y(60)
-    pdf.cell(792, 80, so, ln=1, align="C")
+def make_single_label_pdf(merged_doc, font_xref, so, scac, pro, pallet_location, idx, total):
+    """
+    Appends one label page to merged_doc: the cached base template and
+    barcode, plus the per-label text written straight into the page's
+    content against the batch's shared font_xref.
+    """
+    page = merged_doc.new_page(width=LABEL_WIDTH, height=LABEL_HEIGHT)
+    page.show_pdf_page(page.rect, _base_label(so, scac, pro), 0)
 
     # Barcode / PRO
-    if barcode_path:
-        pdf.image(barcode_path, x=196, y=160, w=400, h=100)
-        pdf.set_y(270)
-        pdf.set_font("Arial", "B", 24)
-        pdf.cell(792, 30, pro, ln=1, align="C")
+    if pro:
+        page.show_pdf_page(BARCODE_RECT, _barcode_page(pro), 0)
 
-    # Carrier / SCAC
-    pdf.set_y(360)
-    pdf.set_font("Arial", "B", 130)
-    pdf.cell(792, 100, scac, ln=1, align="C")
+    # Bottom-center count
+    ops = [b"0 g", _centered_text_op(564, f"{idx} of {total}", 80)]
 
     # Bottom-left pallet location
     if pallet_location:
-        pdf.set_font("Arial", "B", 72)
-        pdf.set_xy(30, 545)
-        pdf.cell(300, 80, pallet_location, ln=0, align="L")
+        ops.append(_text_op(32.8, 606.6, pallet_location, 72))
 
-    # Bottom-center count
-    pdf.set_y(500)
-    pdf.set_font("Arial", "B", 80)
-    pdf.cell(792, 80, f"{idx} of {total}", ln=1, align="C")
-
-    buffer = BytesIO()
-    buffer.write(pdf.output(dest="S").encode("latin1"))
-    buffer.seek(0)
-
-    if barcode_path and os.path.exists(barcode_path):
-        os.remove(barcode_path)
-
-    return buffer.read()
-
-def make_labels(so, scac, pro, qty, load_numbers):
-    labels = []
-
-    for i in range(qty):
-        pallet_location = load_numbers[i] if i < len(load_numbers) else ""
-        labels.append(
-            make_single_label_pdf(
-                so,
-                scac,
-                pro,
-                pallet_location,
-                i + 1,
-                qty
+    overlay_xref = merged_doc.get_new_xref()
+    merged_doc.update_object(overlay_xref, "<< >>")
+    merged_doc.update_stream(overlay_xref, b"\n".join(ops))
+
+    contents = page.get_contents() + [overlay_xref]
+    merged_doc.xref_set_key(page.xref, "Contents", "[%s]" % " ".join(f"{x} 0 R" for x in contents))
+
+    kind, resources = merged_doc.xref_get_key(page.xref, "Resources")
+    if kind == "xref":
+        merged_doc.xref_set_key(int(resources.split()[0]), "Font", f"<< /F1 {font_xref} 0 R >>")
+    else:
+        merged_doc.xref_set_key(page.xref, "Resources/Font", f"<< /F1 {font_xref} 0 R >>")
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def make_labels_batch(entries):
+    """
+    Builds every label for a batch of (so, scac, pro, qty, load_numbers)
+    entries into one PDF and returns its bytes. The label font is set up
+    once here instead of once per page. entries is a tuple of tuples so
+    reruns with the same batch come straight from the cache.
+    """
+    with fitz.open() as merged_doc:
+        font_xref = merged_doc.get_new_xref()
+        merged_doc.update_object(font_xref, HELVETICA_BOLD_FONT)
+
+        for so, scac, pro, qty, load_numbers in entries:
+            for i in range(qty):
+                pallet_location = load_numbers[i] if i < len(load_numbers) else ""
+                make_single_label_pdf(merged_doc, font_xref, so, scac, pro, pallet_location, i + 1, qty)
+
+        return merged_doc.tobytes(**PDF_SAVE_OPTIONS)
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def process_bol(file_bytes, shipper_name, today):
+    """
+    Stamps the signature text on every page of one uploaded BOL and
+    extracts the label fields per page.
+    Returns (stamped PDF bytes, list of fields per page). Cached on the
+    arguments so widget reruns reuse the work for unchanged uploads; the
+    cache is shared server-wide, so it is capped in size and age.
+    """
+    pages = []
+
+    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+        # One pass per page: stamp the signature text, then extract fields
+        for page in doc:
+            page.insert_text(
+                (88, 745),
+                f"{shipper_name or '__________________'}    {today}",
+                fontsize=11,
+                fontname="helv"
             )
-        )
 
-    return labels
+            pages.append(extract_fields(page.get_text("text", flags=_TEXT_FLAGS)))
+
+        return doc.tobytes(), pages
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def combine_bols(file_bytes_list, shipper_name, today):
+    """
+    Stamped copies of every uploaded BOL, in upload order, as one PDF.
+    Returns its bytes. Cached like process_bol, so reruns with the same
+    uploads skip the merge and save.
+    """
+    with fitz.open() as combined_bol:
+        for file_bytes in file_bytes_list:
+            bol_bytes, _ = process_bol(file_bytes, shipper_name, today)
+            with fitz.open(stream=bol_bytes, filetype="pdf") as doc:
+                combined_bol.insert_pdf(doc)
+
+        return combined_bol.tobytes(**PDF_SAVE_OPTIONS)
 
 # ---------------- Manual Entry Mode ----------------
 
 if manual_mode:
     st.subheader("Manual Shipment Entry")
 
-    header = st.columns([3, 3, 2, 2, 3])
-    header[0].markdown("**Sales Order / Primary Ref**")
-    header[1].markdown("**PRO (Barcode)**")
-    header[2].markdown("**Carrier**")
-    header[3].markdown("**Quantity**")
-    header[4].markdown("**Pallet Locations (comma-separated)**")
-
-    rows = []
+    if "manual_df" not in st.session_state:
+        st.session_state.manual_df = pd.DataFrame({
+            "SO": [""] * 20,
+            "PRO": [""] * 20,
+            "SCAC": [""] * 20,
+            "QTY": [1] * 20,
+            "Loads": [""] * 20,
+        })
+
+    edited = st.data_editor(
+        st.session_state.manual_df,
+        key="manual_grid",
+        num_rows="dynamic",
+        hide_index=True,
+        column_config={
+            "SO": st.column_config.TextColumn("Sales Order / Primary Ref"),
+            "PRO": st.column_config.TextColumn("PRO (Barcode)"),
+            "SCAC": st.column_config.TextColumn("Carrier"),
+            "QTY": st.column_config.NumberColumn("Quantity", min_value=1, step=1, default=1),
+            "Loads": st.column_config.TextColumn(
+                "Pallet Locations (comma-separated)",
+                help="Example: C16, A26"
+            ),
+        }
+    )
 
-    for i in range(20):
-        cols = st.columns([3, 3, 2, 2, 3])
+    # Rows added in the grid start out empty (None / NaN)
+    edited = edited.fillna({"SO": "", "PRO": "", "SCAC": "", "QTY": 1, "Loads": ""})
 
-        so = cols[0].text_input("", key=f"so_{i}")
-        pro = cols[1].text_input("", key=f"pro_{i}")
-        scac = cols[2].text_input("", key=f"scac_{i}")
-        qty = cols[3].number_input("", min_value=1, value=1, key=f"qty_{i}")
-        loads = cols[4].text_input("", key=f"load_{i}", help="Example: C16, A26")
+    rows = []
 
-        if so.strip():
-            rows.append((so, pro, scac, qty, loads))
+    for row in edited.itertuples(index=False):
+        if row.SO.strip():
+            rows.append((row.SO, row.PRO, row.SCAC, int(row.QTY), row.Loads))
 
     if st.button("🧙‍♂️ Generate Labels"):
-        all_labels = []
-
-        for so, pro, scac, qty, loads in rows:
-            all_labels.extend(
-                make_labels(
-                    so.strip(),
-                    scac.strip(),
-                    pro.strip(),
-                    qty,
-                    split_csv_like(loads)
-                )
-            )
+        entries = tuple(
+            (so.strip(), scac.strip(), pro.strip(), qty, tuple(split_csv_like(loads)))
+            for so, pro, scac, qty, loads in rows
+        )
 
-        if all_labels:
+        if entries:
             ts = datetime.now(ZoneInfo("America/Chicago")).strftime("%Y%m%d-%H%M%S")
 
-            merged = fitz.open()
-            for pdf_bytes in all_labels:
-                merged.insert_pdf(fitz.open(stream=pdf_bytes, filetype="pdf"))
-
-            buf = BytesIO()
-            merged.save(buf)
-            buf.seek(0)
-
             st.download_button(
                 "📥 Download Labels PDF",
-                buf,
+                make_labels_batch(entries),
                 file_name=f"magic_labels_{ts}.pdf",
                 mime="application/pdf"
             )
@@ -302,67 +521,41 @@ if not manual_mode:
     )
 
     if uploaded_files:
-        all_labels = []
-        combined_bol = fitz.open()
+        entries = []
+        file_bytes_list = tuple(f.getvalue() for f in uploaded_files)
         today = datetime.now(ZoneInfo("America/Chicago")).strftime("%m/%d/%Y")
 
-        for f in uploaded_files:
-            doc = fitz.open(stream=f.read(), filetype="pdf")
-
-            # Put signature text on every page
-            for page in doc:
-                page.insert_text(
-                    (88, 745),
-                    f"{shipper_name or '__________________'}    {today}",
-                    fontsize=11,
-                    fontname="helv"
-                )
-
-            combined_bol.insert_pdf(doc)
-
-            # Extract labels per page
-            for page in doc:
-                fields = extract_fields(page.get_text())
+        for file_bytes in file_bytes_list:
+            _, pages = process_bol(file_bytes, shipper_name, today)
 
+            # Labels per page
+            for fields in pages:
                 if debug:
                     st.write(fields)
 
-                if fields["so"]:
-                    all_labels.extend(
-                        make_labels(
-                            fields["so"],
-                            fields["scac"],
-                            fields["pro"],
-                            fields["qty"],
-                            fields["load_numbers"]
-                        )
-                    )
-
-        if all_labels:
-            ts = datetime.now(ZoneInfo("America/Chicago")).strftime("%Y%m%d-%H%M%S")
-
-            merged = fitz.open()
-            for pdf_bytes in all_labels:
-                merged.insert_pdf(fitz.open(stream=pdf_bytes, filetype="pdf"))
-
-            label_buf = BytesIO()
-            merged.save(label_buf)
-            label_buf.seek(0)
+                if fields["so"] and fields["qty"]:
+                    entries.append((
+                        fields["so"],
+                        fields["scac"],
+                        fields["pro"],
+                        fields["qty"],
+                        tuple(fields["load_numbers"])
+                    ))
 
-            bol_buf = BytesIO()
-            combined_bol.save(bol_buf)
-            bol_buf.seek(0)
+        if entries:
+            ts = datetime.now(ZoneInfo("America/Chicago")).strftime("%Y%m%d-%H%M%S")
 
             st.download_button(
                 "📥 Download Labels PDF",
-                label_buf,
+                make_labels_batch(tuple(entries)),
                 file_name=f"magic_labels_{ts}.pdf",
                 mime="application/pdf"
             )
 
             st.download_button(
                 "📥 Download BOLs PDF",
-                bol_buf,
+                combine_bols(file_bytes_list, shipper_name, today),
                 file_name=f"bols_{ts}.pdf",
                 mime="application/pdf"
             )
+